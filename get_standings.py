@@ -1,57 +1,67 @@
 #!/usr/bin/python
 import sqlite3
+from contextlib import closing
 from pathlib import Path
-from typing import List, Dict
+from typing import Iterator, Tuple
 import argparse
 
 
-def calculate_points(db_path: str | Path, league_prefix: str) -> List[Dict]:
+FETCH_SIZE = 1000  # rows pulled from the cursor per batch
+
+
+def prefix_range(prefix: str) -> tuple[str, str]:
+    """
+    [lo, hi) bounds matching every facr_game_id that starts with prefix.
+    """
+    prefix = prefix.upper()  # FAČR ids are upper case
+    if not prefix:
+        return "", "\U0010ffff"
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def calculate_points(db_path: str | Path, league_prefix: str) -> Iterator[Tuple]:
     """
     Calculate points per team for a given league_id prefix.
+    Yields (team_id, team_name, points) tuples as the cursor produces them,
+    FETCH_SIZE at a time.
     """
     sql = """
     SELECT
         t.team_id,
         t.team_name,
-        SUM(r.points) AS points
-    FROM (
-            -- home side
-            SELECT
-                home_team_id AS team_id,
-                CASE
-                    WHEN home_team_goals > guest_team_goals THEN 3
-                    WHEN home_team_goals = guest_team_goals THEN 1
-                    ELSE 0
-                END AS points
-            FROM games
-            WHERE home_team_goals IS NOT NULL
-              AND facr_game_id LIKE ?
-
-          UNION ALL
-
-            -- away side
-            SELECT
-                guest_team_id AS team_id,
-                CASE
-                    WHEN guest_team_goals > home_team_goals THEN 3
-                    WHEN guest_team_goals = home_team_goals THEN 1
-                    ELSE 0
-                END AS points
-            FROM games
-            WHERE guest_team_goals IS NOT NULL
-              AND facr_game_id LIKE ?
-    ) AS r
-    JOIN teams t ON t.team_id = r.team_id
-    GROUP BY t.team_id, t.team_name
+        SUM(
+            CASE
+                -- home side
+                WHEN g.home_team_pk = t.team_pk THEN
+                    CASE
+                        WHEN g.home_team_goals > g.guest_team_goals THEN 3
+                        WHEN g.home_team_goals = g.guest_team_goals THEN 1
+                        ELSE 0
+                    END
+                -- away side
+                ELSE
+                    CASE
+                        WHEN g.guest_team_goals > g.home_team_goals THEN 3
+                        WHEN g.guest_team_goals = g.home_team_goals THEN 1
+                        ELSE 0
+                    END
+            END
+        ) AS points
+    FROM games g
+    JOIN teams t ON t.team_pk IN (g.home_team_pk, g.guest_team_pk)
+    WHERE g.home_team_goals IS NOT NULL
+      AND g.guest_team_goals IS NOT NULL
+      AND g.facr_game_id >= ? AND g.facr_game_id < ?
+    GROUP BY t.team_pk
     ORDER BY points DESC, t.team_name;
     """
 
-    like_pattern = f"{league_prefix}%"
+    lo, hi = prefix_range(league_prefix)
 
-    with sqlite3.connect(str(db_path)) as conn:
-        conn.row_factory = sqlite3.Row
-        rows = conn.execute(sql, (like_pattern, like_pattern)).fetchall()
-        return [dict(r) for r in rows]
+    with closing(sqlite3.connect(str(db_path))) as conn:
+        cur = conn.execute(sql, (lo, hi))
+        while batch := cur.fetchmany(FETCH_SIZE):
+            yield from batch
 
 
 def main():
@@ -63,9 +73,9 @@ def main():
 
     results = calculate_points(args.db_file, args.league_id)
 
-    print(f"Standings for league_id LIKE '{args.league_id}%'")
-    for row in results:
-        print(f"{row['team_name']:<25} {row['points']:>3} pts")
+    print(f"Standings for league_id '{args.league_id.upper()}*'")
+    for _team_id, team_name, points in results:
+        print(f"{team_name:<25} {points:>3} pts")
 
 
 if __name__ == "__main__":
@@ -1,35 +1,41 @@
 #!/usr/bin/python
 import sqlite3
+from contextlib import closing
 import argparse
 from pathlib import Path
-from typing import List, Dict
+from typing import Iterator, Tuple
 
+from get_standings import FETCH_SIZE, prefix_range
 
-def get_top_scorers(db_path: str | Path, league_prefix: str, team_id, limit) -> List[Dict]:
+
+def get_top_scorers(db_path: str | Path, league_prefix: str, team_id, limit) -> Iterator[Tuple]:
     """
     Returns top scorers for a specific team in a given league,
     with player names instead of player IDs.
+    Yields (player_name, team_name, team_id, total_goals, total_games)
+    tuples as the cursor produces them, FETCH_SIZE at a time.
     """
     sql = """
     SELECT
         p.player_name,
         t.team_name,
-        g.team_id,
+        t.team_id,
         SUM(g.goals_scored) AS total_goals,
-        COUNT(DISTINCT g.game_id) AS total_games
+        COUNT(*) AS total_games  -- goals has one row per (game, team, player)
     FROM goals g
-    INNER JOIN players p ON g.player_id = p.player_id
-    INNER JOIN teams t on g.team_id = t.team_id
-    WHERE g.facr_game_id LIKE ?
-    """
-    like_pattern = f"{league_prefix}%"
+    INNER JOIN players p ON g.player_pk = p.player_pk
+    INNER JOIN teams t on g.team_pk = t.team_pk
+    WHERE """
+    lo, hi = prefix_range(league_prefix)
+    # cheap equality first, then the facr_game_id range
     if team_id:
-        sql += """AND g.team_id = ?"""
-        params = [like_pattern, team_id]
+        sql += """g.team_pk = (SELECT team_pk FROM teams WHERE team_id = ?) AND """
+        params = [team_id, lo, hi]
     else:
-        params = [like_pattern]
+        params = [lo, hi]
+    sql += """g.facr_game_id >= ? AND g.facr_game_id < ?"""
     sql += """
-    GROUP BY g.player_id
+    GROUP BY g.player_pk, g.team_pk
     ORDER BY total_goals DESC
     """
 
@@ -38,10 +44,10 @@ def get_top_scorers(db_path: str | Path, league_prefix: str, team_id, limit) ->
         LIMIT ?;"""
         params.append(limit)
 
-    with sqlite3.connect(str(db_path)) as conn:
-        conn.row_factory = sqlite3.Row
-        rows = conn.execute(sql, params).fetchall()
-        return [dict(r) for r in rows]
+    with closing(sqlite3.connect(str(db_path))) as conn:
+        cur = conn.execute(sql, params)
+        while batch := cur.fetchmany(FETCH_SIZE):
+            yield from batch
 
 
 def main():
@@ -57,8 +63,8 @@ def main():
     print(f"\nTop scorers for team '{args.team_id}' in league '{args.league_id}%':\n")
     print(f"{'Player Name':<30} {'Team Name':<40} {'Goals':>5} {'Games':>6}")
     print("-" * 85)
-    for row in scorers:
-        print(f"{row['player_name']:<30} {row['team_name']:<36}  {row['total_goals']:>5} {row['total_games']:>6}")
+    for player_name, team_name, _team_id, total_goals, total_games in scorers:
+        print(f"{player_name:<30} {team_name:<36}  {total_goals:>5} {total_games:>6}")
 
 
 if __name__ == "__main__":
@@ -6,203 +6,516 @@ Usage:
     python save_matches.py --games-url URL1 URL2 ...
 
 A new row is written to `games` for every page and the goal
-table is refreshed for that game_id (safe to re-run).
+table is refreshed for that game_id (safe to re-run). Pages whose
+match is already stored are not fetched again unless --refresh is given.
 
-PREREQ: pip install requests beautifulsoup4 lxml
+PREREQ: pip install requests lxml cssselect
 """
 
-import argparse, re, sqlite3, unicodedata
-from datetime import datetime
+import argparse, functools, re, sqlite3, unicodedata
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator
 
 import requests
-from bs4 import BeautifulSoup
+from lxml import etree
+from lxml.cssselect import CSSSelector
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 ###############################################################################
 # util helpers
 ###############################################################################
+_WS      = re.compile(r"\s+")
+_NONW    = re.compile(r"[^\w]")
+_BRACKET = re.compile(r"\s*\[.*?\]")
+_RE_FACR  = re.compile(r"Číslo utkání:\s*([0-9A-Z.]+)")
+_RE_VENUE = re.compile(r"Hřiště:\s*([^.]+)")
+_RE_SPECT = re.compile(r"Diváků:\s*(\d+)")
+
+
+# Czech/Slovak letters folded in a single C-level str.translate pass
+_ACCENTS = str.maketrans(
+    "áäčďéěíĺľňóôŕřšťúůýžÁÄČĎÉĚÍĹĽŇÓÔŔŘŠŤÚŮÝŽ",
+    "aacdeeillnoorrstuuyzAACDEEILLNOORRSTUUYZ",
+)
+
+
 def strip_accents(txt: str) -> str:
+    txt = txt.translate(_ACCENTS)
+    if txt.isascii():
+        return txt
+    # anything outside the table (ö, ł, …) – fall back to full decomposition
     txt = unicodedata.normalize("NFKD", txt)
     return "".join(c for c in txt if not unicodedata.combining(c))
 
 
+# names repeat across rows and matches, so ids are memoized
+@functools.lru_cache(maxsize=4096)
 def make_id(txt: str) -> str:
-    txt = strip_accents(txt).lower()
-    txt = re.sub(r"\s+", "_", txt.strip())
-    return re.sub(r"[^\w]", "", txt)          # keep a-z0-9_
+    return _NONW.sub("", _WS.sub("_", strip_accents(txt).lower().strip()))  # keep a-z0-9_
+
+
+###############################################################################
+# HTTP
+###############################################################################
+# one keep-alive session for the whole run – no TCP/TLS handshake per page
+session = requests.Session()
+session.headers.update({"Accept-Encoding": "gzip, deflate"})
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16,
+                       max_retries=Retry(total=3, backoff_factor=0.3))
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+_RE_CHARSET = re.compile(r"charset=[\"']?([\w.:-]+)", re.I)
+
+
+def fetch(url: str) -> tuple[Iterator[bytes], str | None]:
+    """
+    Stream raw page bytes, plus the charset declared in the Content-Type
+    header (None if absent – lxml then picks it up from the <meta> tag).
+    """
+    resp = session.get(url, timeout=20, stream=True)
+    try:
+        resp.raise_for_status()
+    except requests.HTTPError:
+        resp.close()
+        raise
+    m = _RE_CHARSET.search(resp.headers.get("Content-Type", ""))
+
+    def chunks():
+        with resp:
+            yield from resp.iter_content(CHUNK_SIZE)
+
+    return chunks(), m.group(1) if m else None
 
 
 ###############################################################################
 # HTML → data
 ###############################################################################
-def parse_match(html: str) -> dict:
-    soup = BeautifulSoup(html, "lxml")
+# selectors are compiled once at import time and reused for every page
+SEL_META          = CSSSelector("h1.Match-meta")
+SEL_TEAMS         = CSSSelector(".Match-teams .Match-team a")
+SEL_DETAILS       = CSSSelector(".Match-detailsContainer")
+SEL_RESULT_P      = CSSSelector(".Match-result p")
+SEL_RESULT_STRONG = CSSSelector(".Match-result strong")
+SEL_SECTIONS      = CSSSelector(".Match-statsGrid section")
+SEL_H2            = CSSSelector("h2")
+SEL_ROWS          = CSSSelector("tbody tr")
+TL_XPATH = etree.XPath('//li[contains(concat(" ", normalize-space(@class), " "), " MatchTimeline-item ")]')
+
+
+# subtrees we never read – dropped as soon as the parser closes them
+PRUNE_TAGS = {"head", "script", "style", "noscript", "svg", "iframe"}
+
+
+def build_tree(chunks: Iterable[bytes], encoding: str | None = None) -> etree._Element:
+    """
+    Incrementally parse HTML chunks, discarding PRUNE_TAGS subtrees on the
+    fly so the retained tree holds little more than the match markup.
+    """
+    parser = etree.HTMLPullParser(events=("end",), tag=PRUNE_TAGS, remove_comments=True,
+                                  encoding=encoding)
+    for chunk in chunks:
+        parser.feed(chunk)
+        for _, el in parser.read_events():
+            el.clear(keep_tail=True)
+    return parser.close()
+
+
+def text_of(el, sep: str = "") -> str:
+    """Stripped text of all descendant nodes joined by `sep` (like bs4 get_text(sep, strip=True))."""
+    return sep.join(s for s in (t.strip() for t in el.itertext()) if s)
+
+
+def parse_match(html: bytes | Iterable[bytes], encoding: str | None = None) -> dict:
+    tree = build_tree((html,) if isinstance(html, bytes) else html, encoding)
 
     # ── meta ────────────────────────────────────────────────────────────────
-    meta_parts = soup.select_one("h1.Match-meta").get_text(",").split(",")
+    meta_parts = ",".join(SEL_META(tree)[0].itertext()).split(",")
     dt_raw, round_part = meta_parts[0].strip(), (meta_parts[1].strip() if len(meta_parts) > 1 else "")
-    date_iso = datetime.strptime(dt_raw, "%d. %m. %Y %H:%M").strftime("%Y-%m-%d")
-
-    teams_el = soup.select(".Match-teams .Match-team a")
-    home_name, guest_name = (t.get_text(strip=True) for t in teams_el[:2])
+    # "12. 04. 2025 10:00" – split instead of strptime, day/month may be unpadded
+    day, month, rest = dt_raw.split(".", 2)
+    day, month, year = int(day), int(month), int(rest.split()[0])
+    date_int = year * 10000 + month * 100 + day          # YYYYMMDD
+    date_iso = f"{year:04d}-{month:02d}-{day:02d}"
+
+    teams_el = SEL_TEAMS(tree)
+    home_name, guest_name = (text_of(t) for t in teams_el[:2])
     home_id, guest_id = make_id(home_name), make_id(guest_name)
 
-    details = soup.select_one(".Match-detailsContainer").get_text(" ", strip=True)
-    facr_game_id = re.search(r"Číslo utkání:\s*([0-9A-Z.]+)", details).group(1)
-    venue = (re.search(r"Hřiště:\s*([^.]+)", details) or ["", ""]).group(1).strip()
-    spectators = (re.search(r"Diváků:\s*(\d+)", details))
+    details = text_of(SEL_DETAILS(tree)[0], " ")
+    facr_game_id = _RE_FACR.search(details).group(1)
+    venue = _RE_VENUE.search(details)
+    venue = venue.group(1).strip() if venue else ""
+    spectators = _RE_SPECT.search(details)
     spectators = int(spectators.group(1) if spectators else 0 )
 
-    halftime_score = soup.select_one(".Match-result p").get_text(strip=True).strip("()")
-    final_score = soup.select_one(".Match-result strong").get_text(strip=True)
+    halftime_score = text_of(SEL_RESULT_P(tree)[0]).strip("()")
+    final_score = text_of(SEL_RESULT_STRONG(tree)[0])
+    home_goals, guest_goals = (int(x) for x in final_score.split(":")[:2])
 
     game_id = f"{home_id}_{guest_id}_{date_iso}_{round_part}"
 
+    teams = {home_id: home_name, guest_id: guest_name}
+
+    # per team parallel lists (player_ids[i], player_names[i], goals[i])
+    squads = {}  # { team_id: {"player_ids": [], "player_names": [], "goals": []} }
+    slots = {}   # { team_id: {player_id: i} }
+
+    def player_slot(team_id: str, pid: str, name: str) -> int:
+        team_slots = slots.setdefault(team_id, {})
+        if pid not in team_slots:
+            sq = squads.setdefault(team_id, {"player_ids": [], "player_names": [], "goals": []})
+            team_slots[pid] = len(sq["player_ids"])
+            sq["player_ids"].append(pid)
+            sq["player_names"].append(name)
+            sq["goals"].append(0)  # every listed player starts with 0
+        return team_slots[pid]
+
     # ── 1. all squad players ───────────────────────────────────────────────
-    squad = {}  # { (player_id, team_id): (player_name, team_name) }
-    for section in soup.select(".Match-statsGrid section"):
-        team_name = section.select_one("h2").get_text(strip=True)
+    for section in SEL_SECTIONS(tree):
+        team_name = text_of(SEL_H2(section)[0])
         team_id = make_id(team_name)
-        for row in section.select("tbody tr"):
-            cols = row.find_all("td")
+        teams.setdefault(team_id, team_name)
+        for row in SEL_ROWS(section):
+            cols = row.findall("td")
             if len(cols) >= 3:
-                name_cell = cols[2].get_text(strip=True)
-                name = re.sub(r"\s*\[.*?\]", "", name_cell)  # drop [K] etc.
-                pid = make_id(name)
-                squad[(pid, team_id)] = (name, team_name)
+                name_cell = text_of(cols[2])
+                name = _BRACKET.sub("", name_cell)  # drop [K] etc.
+                player_slot(team_id, make_id(name), name)
 
     # ── 2. goals from timeline ─────────────────────────────────────────────
-    goal_counts = {k: 0 for k in squad}  # start every listed player with 0
-    for li in soup.select(".MatchTimeline-item"):
-        name = li.select_one("p").get_text(strip=True)
-        team_name = home_name if "MatchTimeline-item--home" in li["class"] else guest_name
-        team_id = home_id if team_name == home_name else guest_id
-        pid = make_id(name)
-        key = (pid, team_id)
-        # Player might not be in squad list (rare) – add on the fly
-        if key not in squad:
-            squad[key] = (name, team_name)
-            goal_counts[key] = 0
-        goal_counts[key] += 1
+    scored = Counter(
+        (home_id if "MatchTimeline-item--home" in li.get("class", "") else guest_id,
+         text_of(li.find(".//p")))  # same extraction as squad names, so ids match
+        for li in TL_XPATH(tree)
+    )  # { (team_id, player_name): goals }
+    for (team_id, name), goals in scored.items():
+        # Player might not be in squad list (rare) – player_slot adds on the fly
+        i = player_slot(team_id, make_id(name), name)
+        squads[team_id]["goals"][i] += goals
 
     return {
-        "game":
+        "game": {
+            "game_id":          game_id,
+            "facr_game_id":     facr_game_id,
+            "date":             date_int,
+            "round":            round_part,
+            "home_team_id":     home_id,
+            "guest_team_id":    guest_id,
+            "venue":            venue,
+            "spectators":       spectators,
+            "halftime_score":   halftime_score,
+            "final_score":      final_score,
+            "home_team_goals":  home_goals,
+            "guest_team_goals": guest_goals,
+        },
+        "teams":   teams,
+        "squads":  squads,
+    }
+
 
 ###############################################################################
 # DB schema & helpers
 ###############################################################################
+# Every table has an INTEGER surrogate key (rowid alias); the readable TEXT
+# ids stay UNIQUE for lookups, while joins and FKs use the 8-byte integers.
+SCHEMA_VERSION = 1   # PRAGMA user_version; 0 is the original TEXT-keyed layout
+
 DDL = """
-PRAGMA foreign_keys = ON;
 CREATE TABLE IF NOT EXISTS teams (
-    team_id   TEXT PRIMARY KEY,
+    team_pk   INTEGER PRIMARY KEY,
+    team_id   TEXT UNIQUE NOT NULL,
     team_name TEXT
 );
 CREATE TABLE IF NOT EXISTS players (
-    player_id   TEXT PRIMARY KEY,
+    player_pk   INTEGER PRIMARY KEY,
+    player_id   TEXT UNIQUE NOT NULL,
     player_name TEXT,
-    team_id     TEXT,
-    team_name   TEXT,
-    FOREIGN KEY (team_id) REFERENCES teams(team_id)
+    team_pk     INTEGER,
+    FOREIGN KEY (team_pk) REFERENCES teams(team_pk)
 );
 CREATE TABLE IF NOT EXISTS games (
-    game_id        TEXT PRIMARY KEY,
+    game_pk        INTEGER PRIMARY KEY,
+    game_id        TEXT UNIQUE NOT NULL,
+    source_id      TEXT,             -- match id taken from the fotbal.cz URL
     facr_game_id   TEXT,
-    date           TEXT,
+    date           INTEGER,          -- YYYYMMDD
     round          TEXT,
-    home_team_id      TEXT,
-    guest_team_id     TEXT,
+    home_team_pk      INTEGER,
+    guest_team_pk     INTEGER,
     venue          TEXT,
     spectators     INTEGER,
     halftime_score TEXT,
     final_score    TEXT,
     home_team_goals INTEGER,
     guest_team_goals INTEGER,
-    FOREIGN KEY(home_team_id) REFERENCES teams(team_id),
-    FOREIGN KEY(guest_team_id) REFERENCES teams(team_id)
+    FOREIGN KEY(home_team_pk) REFERENCES teams(team_pk),
+    FOREIGN KEY(guest_team_pk) REFERENCES teams(team_pk)
 
 );
 CREATE TABLE IF NOT EXISTS goals (
-    goal_id      INTEGER PRIMARY KEY AUTOINCREMENT,
-    game_id      TEXT,
+    game_pk      INTEGER,
     facr_game_id TEXT,
-    player_id    TEXT,
-    team_id      TEXT,
+    player_pk    INTEGER,
+    team_pk      INTEGER,
     goals_scored INTEGER,
-    FOREIGN KEY (game_id)   REFERENCES games(game_id),
-    FOREIGN KEY (player_id) REFERENCES players(player_id),
-    FOREIGN KEY (team_id)   REFERENCES teams(team_id)
-);
+    PRIMARY KEY (game_pk, team_pk, player_pk),   -- namesakes may play on both sides
+    FOREIGN KEY (game_pk)   REFERENCES games(game_pk),
+    FOREIGN KEY (player_pk) REFERENCES players(player_pk),
+    FOREIGN KEY (team_pk)   REFERENCES teams(team_pk)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_games_facr ON games(facr_game_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_games_source ON games(source_id);
+-- covering indexes for get_stats.py (a WITHOUT ROWID table's PK columns
+-- game_pk/team_pk/player_pk come along for free)
+CREATE INDEX IF NOT EXISTS idx_goals_facr_cov ON goals(facr_game_id, team_pk, goals_scored);
+CREATE INDEX IF NOT EXISTS idx_goals_team_cov ON goals(team_pk, facr_game_id, goals_scored);
 """
 
-def ensure_schema(conn: sqlite3.Connection):
+# bulk-ingest settings for the write connection (WAL also lets the report
+# scripts read while a crawl is running)
+WRITE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",      # 64 MiB
+    "PRAGMA mmap_size = 268435456",    # 256 MiB
+)
+
+
+def tune_connection(conn: sqlite3.Connection):
+    for pragma in WRITE_PRAGMAS:
+        conn.execute(pragma)
+
+
+# Databases written before the surrogate keys (user_version 0) are converted
+# in place: the old tables are renamed to *_v0, the current ones created
+# from DDL and filled from them, then the *_v0 tables are dropped.
+BASELINE_TABLES = ("teams", "players", "games", "goals")
+MIGRATE_FROM_BASELINE = (
+    """INSERT INTO teams (team_id, team_name)
+       SELECT team_id, team_name FROM teams_v0""",
+    """INSERT INTO players (player_id, player_name, team_pk)
+       SELECT p.player_id, p.player_name, t.team_pk
+       FROM players_v0 p LEFT JOIN teams t ON t.team_id = p.team_id""",
+    """INSERT INTO games
+         (game_id, facr_game_id, date, round, home_team_pk, guest_team_pk,
+          venue, spectators, halftime_score, final_score, home_team_goals, guest_team_goals)
+       SELECT g.game_id, g.facr_game_id, CAST(REPLACE(g.date, '-', '') AS INTEGER), g.round,
+              h.team_pk, a.team_pk, g.venue, g.spectators, g.halftime_score, g.final_score,
+              g.home_team_goals, g.guest_team_goals
+       FROM games_v0 g
+       LEFT JOIN teams h ON h.team_id = g.home_team_id
+       LEFT JOIN teams a ON a.team_id = g.guest_team_id""",
+    """INSERT INTO goals (game_pk, facr_game_id, player_pk, team_pk, goals_scored)
+       SELECT gm.game_pk, o.facr_game_id, p.player_pk, t.team_pk, SUM(o.goals_scored)
+       FROM goals_v0 o
+       JOIN games gm  ON gm.game_id  = o.game_id
+       JOIN players p ON p.player_id = o.player_id
+       JOIN teams t   ON t.team_id   = o.team_id
+       GROUP BY gm.game_pk, t.team_pk, p.player_pk""",
+)
+
+
+def create_tables(conn: sqlite3.Connection):
     for stmt in DDL.strip().split(";"):
         stmt = stmt.strip()
         if stmt:
             conn.execute(stmt)
+
+
+def migrate_from_baseline(conn: sqlite3.Connection):
+    for table in BASELINE_TABLES:
+        conn.execute(f"ALTER TABLE {table} RENAME TO {table}_v0")
+    create_tables(conn)
+    for stmt in MIGRATE_FROM_BASELINE:
+        conn.execute(stmt)
+    for table in reversed(BASELINE_TABLES):
+        conn.execute(f"DROP TABLE {table}_v0")
+
+
+def ensure_schema(conn: sqlite3.Connection):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    has_tables = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'games'").fetchone()
+    if has_tables and version == 0:
+        conn.execute("BEGIN")
+        migrate_from_baseline(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    elif has_tables and version != SCHEMA_VERSION:
+        raise SystemExit(f"games_database.db has schema version {version}, expected "
+                         f"{SCHEMA_VERSION}; move it away and re-run the crawl")
+    elif not has_tables:
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    create_tables(conn)
     conn.commit()
 
 
+INSERT_TEAMS_SQL = "INSERT OR IGNORE INTO teams (team_id, team_name) VALUES (?,?)"
+# a refreshed page may yield a new game_id (date or team name changed) –
+# re-key the row already stored for that URL before the game_id upsert.
+# Its goal rows are dropped on a re-key: after a team rename they belong to
+# the old team_pk and would otherwise be counted next to the new ones.
+REKEY_GAME_SQL = "UPDATE games SET game_id = ? WHERE source_id = ? AND game_id <> ?"
+# upsert (not REPLACE) so a re-crawled game keeps its game_pk
+INSERT_GAME_SQL = """
+    INSERT INTO games
+      (game_id, source_id, facr_game_id, date, round, home_team_pk, guest_team_pk,
+       venue, spectators, halftime_score, final_score, home_team_goals, guest_team_goals)
+    VALUES (?,?,?,?,?,
+            (SELECT team_pk FROM teams WHERE team_id = ?),
+            (SELECT team_pk FROM teams WHERE team_id = ?),
+            ?,?,?,?,?,?)
+    ON CONFLICT(game_id) DO UPDATE SET
+      source_id = excluded.source_id, facr_game_id = excluded.facr_game_id, date = excluded.date, round = excluded.round,
+      home_team_pk = excluded.home_team_pk, guest_team_pk = excluded.guest_team_pk,
+      venue = excluded.venue, spectators = excluded.spectators,
+      halftime_score = excluded.halftime_score, final_score = excluded.final_score,
+      home_team_goals = excluded.home_team_goals, guest_team_goals = excluded.guest_team_goals
+"""
+INSERT_PLAYERS_SQL = """
+    INSERT OR IGNORE INTO players
+      (player_id, player_name, team_pk)
+    VALUES (?,?,(SELECT team_pk FROM teams WHERE team_id = ?))
+"""
+# one row per (game, team, player): re-crawls update in place instead of DELETE+INSERT
+UPSERT_GOALS_SQL = """
+    INSERT INTO goals
+      (game_pk, facr_game_id, player_pk, team_pk, goals_scored)
+    VALUES ((SELECT game_pk FROM games WHERE game_id = ?), ?,
+            (SELECT player_pk FROM players WHERE player_id = ?),
+            (SELECT team_pk FROM teams WHERE team_id = ?), ?)
+    ON CONFLICT(game_pk, team_pk, player_pk) DO UPDATE SET
+      facr_game_id = excluded.facr_game_id,
+      goals_scored = excluded.goals_scored
+"""
+# drop this game's rows a re-crawl no longer produced (player gone from the
+# page, renamed, moved team); {keep} expands to one "(?,?)" per written row
+DELETE_STALE_GOALS_SQL = """
+    DELETE FROM goals
+    WHERE game_pk = (SELECT game_pk FROM games WHERE game_id = ?)
+      AND (team_pk, player_pk) NOT IN (
+          SELECT t.team_pk, p.player_pk
+          FROM (VALUES {keep}) AS k
+          JOIN teams t   ON t.team_id   = k.column1
+          JOIN players p ON p.player_id = k.column2)
+"""
+DELETE_GAME_GOALS_SQL = "DELETE FROM goals WHERE game_pk = (SELECT game_pk FROM games WHERE game_id = ?)"
+
+
+def store_match(cur: sqlite3.Cursor, data: dict):
+    g = data["game"]
+    gid, fgid = g["game_id"], g["facr_game_id"]
+
+    teams_rows = list(data["teams"].items())
+    player_rows = [(pid, pname, tid)
+                   for tid, sq in data["squads"].items()
+                   for pid, pname in zip(sq["player_ids"], sq["player_names"])]
+    goal_rows = [(gid, fgid, pid, tid, goals)
+                 for tid, sq in data["squads"].items()
+                 for pid, goals in zip(sq["player_ids"], sq["goals"])]
+
+    cur.executemany(INSERT_TEAMS_SQL, teams_rows)
+    if cur.execute(REKEY_GAME_SQL, (gid, g["source_id"], gid)).rowcount:
+        cur.execute(DELETE_GAME_GOALS_SQL, (gid,))
+    cur.execute(INSERT_GAME_SQL, (gid, g["source_id"], fgid, g["date"], g["round"],
+                g["home_team_id"], g["guest_team_id"], g["venue"], g["spectators"],
+                g["halftime_score"], g["final_score"], g["home_team_goals"], g["guest_team_goals"]))
+    cur.executemany(INSERT_PLAYERS_SQL, player_rows)
+    cur.executemany(UPSERT_GOALS_SQL, goal_rows)
+    if goal_rows:
+        keep = ",".join(["(?,?)"] * len(goal_rows))
+        cur.execute(DELETE_STALE_GOALS_SQL.format(keep=keep),
+                    [gid] + [v for _, _, pid, tid, _ in goal_rows for v in (tid, pid)])
+    else:
+        cur.execute(DELETE_GAME_GOALS_SQL, (gid,))
+
+
 ###############################################################################
 # Main
 ###############################################################################
+MAX_WORKERS = 8     # parallel page fetch+parse threads
+COMMIT_EVERY = 25   # games per sqlite transaction
+
+
+_RE_MATCH_URL = re.compile(r"/zapas/([0-9a-fA-F-]+)")
+
+
+def source_id(url: str) -> str:
+    """fotbal.cz match id from .../zapasy/zapas/<id>; the whole URL otherwise."""
+    m = _RE_MATCH_URL.search(url)
+    return m.group(1).lower() if m else url
+
+
+def fetch_and_parse(url: str) -> dict:
+    print(f"Fetching {url}")
+    data = parse_match(*fetch(url))
+    data["game"]["source_id"] = source_id(url)
+    return data
+
+
 def main():
     ap = argparse.ArgumentParser(description="Store FAČR matches, including non-scoring players.")
     ap.add_argument("--games-url", required=True, help="Text file with match URLs, one per line")
+    ap.add_argument("--refresh", action="store_true", help="Re-fetch games that are already stored")
     args = ap.parse_args()
 
     with open(args.games_url, encoding="utf-8") as fp:
         urls = [u.strip() for u in fp if u.strip()]
 
+    # the connection is only ever touched from this (main) thread
     conn = sqlite3.connect("games_database.db")
+    tune_connection(conn)
     ensure_schema(conn)
     cur = conn.cursor()
 
-    for url in urls:
-        try:
-            print(f"Fetching {url}")
-            html = requests.get(url, timeout=20).text
-            data = parse_match(html)
-
-            # TEAMS
-            for tid, tname in data["teams"].items():
-                cur.execute("INSERT OR IGNORE INTO teams (team_id, team_name) VALUES (?,?)",
-                            (tid, tname))
-
-            # GAME
-            g = data["game"]
-            cur.execute("""
-                INSERT OR REPLACE INTO games
-                  (game_id, facr_game_id, date, round, home_team_id, guest_team_id,
-                   venue, spectators, halftime_score, final_score, home_team_goals, guest_team_goals)
-                VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
-            """, (g["game_id"], g["facr_game_id"], g["date"], g["round"],
-                  g["home_team_id"], g["guest_team_id"], g["venue"], g["spectators"],
-                  g["halftime_score"], g["final_score"], g["home_team_goals"],g["guest_team_goals"]))
-
-            # PLAYERS
-            for (pid, tid), (pname, tname) in data["players"].items():
-                cur.execute("""
-                    INSERT OR IGNORE INTO players
-                      (player_id, player_name, team_id, team_name)
-                    VALUES (?,?,?,?)
-                """, (pid, pname, tid, tname))
-
-            # GOALS
-            cur.execute("DELETE FROM goals WHERE game_id = ?", (g["game_id"],))
-            for (pid, tid), goals in data["goals"].items():
-                cur.execute("""
-                    INSERT INTO goals
-                      (game_id, facr_game_id, player_id, team_id, goals_scored)
-                    VALUES (?,?,?,?,?)
-                """, (g["game_id"], g["facr_game_id"], pid, tid, goals))
-
-            conn.commit()
-            print(f"Stored {g['game_id']} (incl. {len(data['players'])} players)")
-
-        except Exception as exc:
-            conn.rollback()
-            print(f"Skipped {url}: {exc}")
+    if not args.refresh:
+        stored = {r[0] for r in conn.execute("SELECT source_id FROM games WHERE source_id IS NOT NULL")}
+        new_urls = [u for u in urls if source_id(u) not in stored]
+        if len(new_urls) < len(urls):
+            print(f"Skipping {len(urls) - len(new_urls)} already stored games (use --refresh to re-fetch)")
+        urls = new_urls
+
+    pending = 0
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {pool.submit(fetch_and_parse, url): url for url in urls}
+        for fut in as_completed(futures):
+            url = futures[fut]
+            try:
+                data = fut.result()
+            except Exception as exc:
+                print(f"Skipped {url}: {exc}")
+                continue
+
+            if not conn.in_transaction:
+                cur.execute("BEGIN")
+            # a savepoint per game, so one bad page does not roll back the batch
+            cur.execute("SAVEPOINT game")
+            try:
+                store_match(cur, data)
+                cur.execute("RELEASE game")
+            except Exception as exc:
+                cur.execute("ROLLBACK TO game")
+                cur.execute("RELEASE game")
+                print(f"Skipped {url}: {exc}")
+                continue
+
+            n_players = sum(len(sq["player_ids"]) for sq in data["squads"].values())
+            print(f"Stored {data['game']['game_id']} (incl. {n_players} players)")
+            pending += 1
+            if pending >= COMMIT_EVERY:
+                conn.commit()
+                pending = 0
 
+    conn.commit()
     conn.close()
 
 